@@ -5,13 +5,21 @@ This service will continually run and query the EventLogEntry table from
 Shotgrid and converts them to Ayon events, and can be configured from the Ayon
 Addon settings page.
 """
+import os
 import sys
 import json
 import time
+import hashlib
+import logging
+import queue
 import signal
 import socket
+import threading
 import traceback
-from typing import Any
+import tempfile
+import collections
+import concurrent.futures
+from typing import Any, Optional
 from pprint import pformat
 
 from utils import (
@@ -26,6 +34,7 @@ from constants import (
 
 import ayon_api
 import shotgun_api3
+from requests.adapters import HTTPAdapter
 
 # TODO: remove hash in future since it is only used as backward compatibility
 LAST_EVENT_QUERY = """query LastShotgridEvent($eventTopic: String!) {
@@ -40,6 +49,32 @@ LAST_EVENT_QUERY = """query LastShotgridEvent($eventTopic: String!) {
 }
 """
 
+# Environment variable overriding the file where the id of the last
+# dispatched Shotgrid event is stored, see `_get_last_event_id_path`.
+LAST_EVENT_ID_FILE_ENV = "AYON_SHOTGRID_LAST_EVENT_FILE"
+# Maximum of Shotgrid events waiting to be dispatched to AYON, once reached
+# the Shotgrid polling waits for the dispatching to catch up.
+EVENTS_QUEUE_SIZE = 200
+# Seconds the list of projects with "AYON Auto Sync" enabled is cached for.
+SG_PROJECTS_REFRESH_INTERVAL = 60
+# Maximum of events fetched from Shotgrid by a single query.
+SG_EVENTS_QUERY_LIMIT = 500
+# Adaptive polling, the wait between polls grows by the back off factor on
+# every empty poll up to the polling frequency times the max multiplier, and
+# is halved down to the min wait whenever new events are found.
+POLLING_BACKOFF_FACTOR = 1.5
+POLLING_MAX_MULTIPLIER = 4
+POLLING_MIN_WAIT = 0.5
+# Seconds the teardown waits for the producer to close the Shotgrid session.
+PRODUCER_STOP_TIMEOUT = 5
+# Seconds the producer waits on a full queue before checking for a stop.
+QUEUE_PUT_TIMEOUT = 0.5
+# Number of threads dispatching events to AYON, each one handles the events
+# of a single project at a time.
+DISPATCH_WORKERS = 8
+# Maximum of Shotgrid project codes kept in memory.
+PROJECT_CODES_CACHE_SIZE = 1024
+
 
 class ShotgridListener:
     log = get_logger(__file__)
@@ -58,8 +93,17 @@ class ShotgridListener:
             service_settings = self.settings["service_settings"]
 
             self.sg_url = self.settings["shotgrid_server"]
+            self._last_event_id_path = self._get_last_event_id_path()
             self.sg_project_code_field = self.settings[
                 "shotgrid_project_code_field"]
+            self._sg_project_fields = [self.sg_project_code_field]
+            self._sg_project_codes = collections.OrderedDict()
+            self._base_sg_filters = []
+            self._base_sg_filters_time = 0
+            # events query filters, the base filters plus the id filter
+            # whose value is updated in place before every query
+            self._sg_id_filter = ["id", "greater_than", 0]
+            self._sg_events_filters = []
 
             # get server op related ShotGrid script api properties
             shotgrid_secret = ayon_api.get_secret(
@@ -91,7 +135,8 @@ class ShotgridListener:
                 for attr in self.settings["compatibility_settings"]["custom_attribs_map"]  # noqa: E501
                 if attr["sg"]
             }
-            self.custom_sg_attribs = set(self.custom_attribs_map.values())
+            self.custom_sg_attribs = frozenset(
+                self.custom_attribs_map.values())
 
             # TODO: implement a way to handle status_list and tags
             self.custom_attribs_map.update({
@@ -100,6 +145,8 @@ class ShotgridListener:
             })
 
             self.sg_enabled_entities = self.settings["compatibility_settings"]["shotgrid_enabled_entities"]  # noqa: E501
+            self.sg_supported_event_types = frozenset(
+                self._get_supported_event_types())
 
             try:
                 self.shotgrid_polling_frequency = int(
@@ -124,12 +171,50 @@ class ShotgridListener:
             self.log.error("Unable to connect to Shotgrid Instance:")
             raise e
 
+        self._hostname = socket.gethostname()
+
+        self._stop_event = threading.Event()
+        self._producer = None
+
+        self._dispatch_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=DISPATCH_WORKERS,
+            thread_name_prefix="AyonDispatch",
+        )
+        self._set_ayon_connection_pool()
+
         signal.signal(signal.SIGINT, self._signal_teardown_handler)
         signal.signal(signal.SIGTERM, self._signal_teardown_handler)
 
+    def _set_ayon_connection_pool(self):
+        """Size the AYON connection pool to the dispatch threads.
+
+        Make sure the AYON connection uses a session, so connections are
+        kept alive between dispatches, with a pool big enough for every
+        dispatch thread to hold its own connection.
+        """
+        ayon_connection = ayon_api.get_server_api_connection()
+        ayon_connection.create_session()
+
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=DISPATCH_WORKERS,
+        )
+        # NOTE: ayon_api does not expose the requests session publicly, this
+        #   relies on the private `_session` set by `create_session`
+        ayon_connection._session.mount("http://", adapter)
+        ayon_connection._session.mount("https://", adapter)
+
     def _signal_teardown_handler(self, signalnum, frame):
         self.log.warning("Process stop requested. Terminating process.")
-        self.sg_session.close()
+        self._dispatch_pool.shutdown(wait=False, cancel_futures=True)
+
+        if self._producer is None:
+            self.sg_session.close()
+        else:
+            # the producer owns the Shotgrid session and closes it on exit
+            self._stop_event.set()
+            self._producer.join(timeout=PRODUCER_STOP_TIMEOUT)
+
         self.log.warning("Termination finished.")
         sys.exit(0)
 
@@ -159,6 +244,37 @@ class ShotgridListener:
 
         return filters
 
+    def _get_base_sg_filters(self):
+        """Get the SG filters for Events query without the event id.
+
+        The filters only change when "AYON Auto Sync" is toggled on a
+        project, so they are cached for `SG_PROJECTS_REFRESH_INTERVAL`
+        seconds. Empty filters are not cached so newly synced projects are
+        picked up on the next poll.
+
+        Returns:
+            filters (list): Filter to apply to the SG query.
+        """
+        if (
+            self._base_sg_filters
+            and time.monotonic() - self._base_sg_filters_time
+            < SG_PROJECTS_REFRESH_INTERVAL
+        ):
+            return self._base_sg_filters
+
+        sg_projects = self.sg_session.find(
+            "Project",
+            filters=[["sg_ayon_auto_sync", "is", True]],
+            fields=["id"],
+        )
+        self._base_sg_filters = self._build_shotgrid_filters(sg_projects)
+        self._base_sg_filters_time = time.monotonic()
+        self._sg_events_filters = self._base_sg_filters + [
+            self._sg_id_filter
+        ]
+
+        return self._base_sg_filters
+
     def _get_supported_event_types(self) -> list[str]:
         sg_event_types = []
         for entity_type in self.sg_enabled_entities:
@@ -177,6 +293,9 @@ class ShotgridListener:
             but this was not efficient in cases where huge amounts of events
             were present in the database.
 
+            The highest id of the queried events is used, so the result does
+            not depend on the order in which the events are returned.
+
         Returns:
             last_event_id (int): The last known Event id.
         """
@@ -188,43 +307,120 @@ class ShotgridListener:
             self.log.error(str(response.errors))
             return None
         data = response.data["data"]
+        event_ids = []
         for node in data["events"]["edges"]:
             summary = node["node"]["summary"]
             summary_data = json.loads(summary)
 
             if summary_data.get("sg_event_id"):
-                return summary_data["sg_event_id"]
+                event_ids.append(summary_data["sg_event_id"])
+                continue
 
             # return it old way
             # TODO: remove hash in future since it is only used
             #       as backward compatibility
             try:
-                return int(node["node"]["hash"])
+                event_ids.append(int(node["node"]["hash"]))
             except ValueError:
                 # if hash is not an integer this can happen if project sync
                 # is using old topic `shotgrid.event`
                 pass
 
-        return None
+        return max(event_ids, default=None)
+
+    def _get_last_event_id_path(self):
+        """Get the path of the file storing the last dispatched event id.
+
+        The default file lives in the system temporary directory and its
+        name contains a hash of the AYON and Shotgrid server urls, so
+        leechers of different servers on the same host do not share it.
+
+        Returns:
+            str: Path to the last event id file.
+        """
+        path = os.environ.get(LAST_EVENT_ID_FILE_ENV)
+        if path:
+            return path
+
+        servers_hash = hashlib.sha256(
+            f"{os.environ.get('AYON_SERVER_URL')}|{self.sg_url}".encode()
+        ).hexdigest()[:16]
+        return os.path.join(
+            tempfile.gettempdir(),
+            f"ayon-shotgrid-leecher-last-event-id-{servers_hash}",
+        )
+
+    def _read_stored_last_event_id(self):
+        """Read the last event ID stored by this leecher.
+
+        Returns:
+            last_event_id (int): The stored Event id, None if not available.
+        """
+        try:
+            with open(self._last_event_id_path, "r") as stream:
+                return int(stream.read().strip())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self.log.warning(
+                "Unable to read last event ID from "
+                f"'{self._last_event_id_path}'."
+            )
+            return None
+
+    def _store_last_event_id(self, last_event_id):
+        """Store the last event ID processed by this leecher.
+
+        The file is replaced atomically so a crash while writing does not
+        leave a partial id behind.
+
+        Args:
+            last_event_id (int): The last processed Event id.
+        """
+        tmp_path = f"{self._last_event_id_path}.tmp"
+        try:
+            with open(tmp_path, "w") as stream:
+                stream.write(str(last_event_id))
+            os.replace(tmp_path, self._last_event_id_path)
+        except OSError:
+            self.log.warning(
+                "Unable to store last event ID to "
+                f"'{self._last_event_id_path}'."
+            )
 
-    def _get_last_event_processed(self, sg_filters):
+    def _get_last_event_processed(self):
         """Find the Event ID for the last SG processed event.
 
-        First attempt to find it via AYON, if none is found we get the last
-        matching event from Shotgrid.
+        Compare the id stored locally by a previous run with the last one
+        found via AYON and use the newest, the stored id can be ahead of
+        AYON since it also covers ignored events. If none is found we start
+        at the moment in time, from the newest event in Shotgrid, regardless
+        of the project, so projects synced later do not replay their whole
+        history.
 
         Returns:
-            last_event_id (int): The last known Event id.
+            last_event_id (int): The last known Event id, None if Shotgrid
+                has no events yet.
         """
-        last_event_id = self._find_last_event_id()
+        known_event_ids = [
+            event_id
+            for event_id in (
+                self._read_stored_last_event_id(),
+                self._find_last_event_id(),
+            )
+            if event_id
+        ]
+        last_event_id = max(known_event_ids, default=None)
+
         if not last_event_id:
             last_event = self.sg_session.find_one(
                 "EventLogEntry",
-                filters=sg_filters,
-                fields=["id", "project"],
+                filters=[],
+                fields=["id"],
                 order=[{"column": "id", "direction": "desc"}],
             )
-            last_event_id = last_event["id"]
+            if last_event:
+                last_event_id = last_event["id"]
 
         return last_event_id
 
@@ -234,102 +430,303 @@ class ShotgridListener:
         Since Shotgrid does not have an event hub per se, we need to query
         the "EventLogEntry table and send these as Ayon events for processing.
 
+        Querying Shotgrid and dispatching to AYON happen in two separate
+        threads connected by a bounded queue, so the latency of one side
+        overlaps with the other, the producer blocks when AYON falls behind.
+
         We try to continue from the last Event processed by the leecher, if
         none is found we start at the moment in time.
         """
         self.log.info("Start listening for Shotgrid Events...")
 
-        last_event_id = None
+        events_queue = queue.Queue(maxsize=EVENTS_QUEUE_SIZE)
 
-        while True:
-            sg_projects = self.sg_session.find(
-                "Project", filters=[["sg_ayon_auto_sync", "is", True]]
-            )
-            sg_filters = self._build_shotgrid_filters(sg_projects)
+        self._producer = threading.Thread(
+            target=self._produce_events,
+            args=(events_queue,),
+            name="ShotgridEventsProducer",
+            daemon=True,
+        )
+        self._producer.start()
 
-            self.log.debug(f"Last Event ID: {last_event_id}")
+        # Consume in the main thread so the signal handlers keep working
+        self._consume_events(events_queue)
 
-            if not sg_filters:
-                self.log.debug(
-                    f"Leecher waiting {self.shotgrid_polling_frequency} "
-                    "seconds. No projects with AYON Auto Sync found."
-                )
-                time.sleep(self.shotgrid_polling_frequency)
-                continue
+    def _produce_events(self, events_queue: queue.Queue):
+        """Query Shotgrid for new events and put them in the queue.
 
-            if last_event_id is None:
-                last_event_id = self._get_last_event_processed(sg_filters)
+        This is the only place where the Shotgrid session is used after
+        initialization, the session is not thread safe. The session is
+        closed here once a stop is requested.
 
-            sg_filters.append(["id", "greater_than", last_event_id])
+        The wait between polls adapts to the activity, it shrinks while
+        events keep coming and grows while there are none, up to
+        `POLLING_MAX_MULTIPLIER` times the polling frequency.
 
-            self.log.debug(f"Shotgrid filters: {sg_filters}")
+        Args:
+            events_queue (queue.Queue): Queue the events are put into,
+                together with the code of their project.
+        """
+        last_event_id = None
+        polling_wait = self.shotgrid_polling_frequency
+        max_polling_wait = (
+            self.shotgrid_polling_frequency * POLLING_MAX_MULTIPLIER
+        )
 
+        while not self._stop_event.is_set():
             try:
+                base_sg_filters = self._get_base_sg_filters()
+
+                self.log.debug("Last Event ID: %s", last_event_id)
+
+                if not base_sg_filters:
+                    self.log.debug(
+                        "Leecher waiting %s seconds. No projects with AYON "
+                        "Auto Sync found.",
+                        self.shotgrid_polling_frequency,
+                    )
+                    self._stop_event.wait(self.shotgrid_polling_frequency)
+                    continue
+
+                if last_event_id is None:
+                    last_event_id = self._get_last_event_processed()
+
+                if last_event_id is None:
+                    self.log.debug(
+                        "Leecher waiting %s seconds. No events found in "
+                        "Shotgrid.",
+                        self.shotgrid_polling_frequency,
+                    )
+                    self._stop_event.wait(self.shotgrid_polling_frequency)
+                    continue
+
+                self._sg_id_filter[2] = last_event_id
+                sg_filters = self._sg_events_filters
+
+                self.log.debug("Shotgrid filters: %s", sg_filters)
+
                 events = self.sg_session.find(
                     "EventLogEntry",
                     sg_filters,
                     SG_EVENT_QUERY_FIELDS,
                     order=[{"column": "id", "direction": "asc"}],
-                    limit=50,
+                    limit=SG_EVENTS_QUERY_LIMIT,
                 )
                 if not events:
+                    polling_wait = min(
+                        polling_wait * POLLING_BACKOFF_FACTOR,
+                        max_polling_wait,
+                    )
                     self.log.debug(
-                        f"Leecher waiting {self.shotgrid_polling_frequency} seconds..."
+                        "Leecher waiting %s seconds...", polling_wait
                     )
-                    time.sleep(self.shotgrid_polling_frequency)
+                    self._stop_event.wait(polling_wait)
                     continue
 
-                self.log.debug(f"Found {len(events)} events in Shotgrid.")
+                polling_wait = max(polling_wait / 2, POLLING_MIN_WAIT)
 
-                sg_projects_by_id = {
-                    sg_project["id"]: sg_project
-                    for sg_project in sg_projects
-                }
-                supported_event_types = []
-                if events:
-                    supported_event_types = self._get_supported_event_types()
+                self.log.debug("Found %s events in Shotgrid.", len(events))
 
                 for event in events:
                     if not event:
                         continue
 
-                    ignore_event = True
-                    last_event_id = event["id"]
+                    sg_project = self._get_event_project(event)
+                    if event["event_type"] == "Shotgun_Project_Change":
+                        # the project code might have changed
+                        self._sg_project_codes.pop(sg_project.get("id"), None)
 
-                    if (
-                        event["event_type"].endswith("_Change")
-                        and (
-                            event["attribute_name"].replace("sg_", "")
-                            not in self.custom_sg_attribs
-                        )
+                    project_code = self._get_project_code(sg_project.get("id"))
+                    if not self._put_event(
+                        events_queue, (event, project_code)
                     ):
-                        # events related to custom attributes changes
-                        # check if event was caused by api user
-                        ignore_event = self._is_api_user_event(event)
-
-                        if not ignore_event:
-                            # check meta if in_create is True and ignore
-                            # those events as they are not useful for us
-                            # we are interested only in changes in entities
-                            # not in creation events
-                            ignore_event = event.get("meta", {}).get(
-                                "in_create")
-
-                    elif event["event_type"] in supported_event_types:
-                        # events related to changes in entities we track
-                        # check if event was caused by api user
-                        ignore_event = self._is_api_user_event(event)
-
-                    if ignore_event:
-                        self.log.info(f"Ignoring event: {event['id']}")
-                        self.log.debug(f"event payload: {pformat(event)}")
+                        break
+
+                    # only move past the event once it is queued, so it is
+                    # queried again if resolving its project code failed
+                    last_event_id = event["id"]
+
+                # a full page means there are more events waiting, query
+                # them right away instead of waiting for the next poll
+                if len(events) < SG_EVENTS_QUERY_LIMIT:
+                    self._stop_event.wait(polling_wait)
+
+            except Exception:
+                self.log.error(traceback.format_exc())
+                self._stop_event.wait(self.shotgrid_polling_frequency)
+
+        self.sg_session.close()
+
+    def _put_event(self, events_queue: queue.Queue, item: tuple) -> bool:
+        """Put an event in the queue, waiting while it is full.
+
+        The consumer runs in the main thread, which also handles the stop
+        request, so the wait is interrupted once a stop is requested.
+
+        Args:
+            events_queue (queue.Queue): Queue the event is put into.
+            item (tuple): The Shotgrid Event data with its project code.
+
+        Returns:
+            bool: True if the event was queued, False if a stop was
+                requested first.
+        """
+        while not self._stop_event.is_set():
+            try:
+                events_queue.put(item, timeout=QUEUE_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _consume_events(self, events_queue: queue.Queue):
+        """Take events from the queue and send the relevant ones to AYON.
+
+        All the events already waiting in the queue are taken at once and
+        dispatched concurrently per project, events of the same project are
+        still dispatched one after the other to keep their order.
+
+        Args:
+            events_queue (queue.Queue): Queue filled by `_produce_events`.
+        """
+        while True:
+            queued_events = [events_queue.get()]
+            while True:
+                try:
+                    queued_events.append(events_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            events_by_project_id = {}
+            for event, project_code in queued_events:
+                try:
+                    if self._is_ignored_event(event):
+                        self.log.info("Ignoring event: %s", event["id"])
+                        if self.log.isEnabledFor(logging.DEBUG):
+                            self.log.debug(
+                                "event payload: %s", pformat(event))
                         continue
 
-                    self.send_shotgrid_event_to_ayon(event, sg_projects_by_id)
+                    project_id = self._get_event_project(event).get("id")
+                    events_by_project_id.setdefault(project_id, []).append(
+                        (event, project_code)
+                    )
+
+                except Exception:
+                    self.log.error(traceback.format_exc())
+
+            futures = [
+                self._dispatch_pool.submit(
+                    self._send_events_to_ayon, project_events
+                )
+                for project_events in events_by_project_id.values()
+            ]
+            concurrent.futures.wait(futures)
+
+            self._store_last_event_id(
+                max(event["id"] for event, _ in queued_events)
+            )
+
+            for _ in queued_events:
+                events_queue.task_done()
+
+    def _is_ignored_event(self, event: dict[str, Any]) -> bool:
+        """Check whether the event should not be sent to AYON.
 
+        Args:
+            event (dict): The Shotgrid Event data.
+
+        Returns:
+            bool: True if the event should be ignored.
+        """
+        ignore_event = True
+        event_type = event["event_type"]
+
+        if (
+            event_type.endswith("_Change")
+            and (
+                event["attribute_name"].replace("sg_", "")
+                not in self.custom_sg_attribs
+            )
+        ):
+            # events related to custom attributes changes
+            # check if event was caused by api user
+            ignore_event = self._is_api_user_event(event)
+
+            if not ignore_event:
+                # check meta if in_create is True and ignore
+                # those events as they are not useful for us
+                # we are interested only in changes in entities
+                # not in creation events
+                ignore_event = event.get("meta", {}).get("in_create")
+
+        elif event_type in self.sg_supported_event_types:
+            # events related to changes in entities we track
+            # check if event was caused by api user
+            ignore_event = self._is_api_user_event(event)
+
+        return bool(ignore_event)
+
+    def _send_events_to_ayon(
+        self, events: list[tuple[dict[str, Any], Optional[str]]]
+    ):
+        """Send Shotgrid events to AYON one after the other.
+
+        Args:
+            events (list[tuple[dict, Optional[str]]]): Shotgrid Events data
+                with the code of their project.
+        """
+        for event, project_code in events:
+            try:
+                self.send_shotgrid_event_to_ayon(event, project_code)
             except Exception:
                 self.log.error(traceback.format_exc())
 
+    def _get_project_code(self, project_id: int) -> Optional[str]:
+        """Get the project code of a Shotgrid Project.
+
+        Project codes are cached in a LRU dictionary, so Shotgrid is only
+        queried the first time a project is seen.
+
+        Args:
+            project_id (int): The Shotgrid Project id.
+
+        Returns:
+            Optional[str]: The value of the project code field.
+        """
+        if project_id in self._sg_project_codes:
+            self._sg_project_codes.move_to_end(project_id)
+            return self._sg_project_codes[project_id]
+
+        sg_project = self.sg_session.find_one(
+            "Project",
+            [["id", "is", project_id]],
+            fields=self._sg_project_fields,
+        )
+        project_code = None
+        if sg_project:
+            project_code = sg_project.get(self.sg_project_code_field)
+
+        self._sg_project_codes[project_id] = project_code
+        if len(self._sg_project_codes) > PROJECT_CODES_CACHE_SIZE:
+            self._sg_project_codes.popitem(last=False)
+
+        return project_code
+
+    @staticmethod
+    def _get_event_project(event: dict[str, Any]) -> dict[str, Any]:
+        """Get the Shotgrid Project entity the event belongs to.
+
+        Args:
+            event (dict): The Shotgrid Event data.
+
+        Returns:
+            dict: The Shotgrid Project entity, empty if not found.
+        """
+        if event.get("meta", {}).get("entity_type") == "Project":
+            return event.get("entity") or {}
+        return event.get("project") or {}
+
     def _is_api_user_event(self, event: dict[str, Any]) -> bool:
         """Check if the event was caused by an API user.
 
@@ -340,19 +737,24 @@ class ShotgridListener:
             bool: True if the event was caused by an API user.
         """
         # TODO: we have to create specific api user filtering
-        if (
-            event.get("meta", {}).get("sudo_actual_user", {}).get("type")
-            == "ApiUser"
-        ):
-            return True
+        meta = event.get("meta")
+        if not meta:
+            return False
+
+        sudo_actual_user = meta.get("sudo_actual_user")
+        if not sudo_actual_user:
+            return False
+
+        return sudo_actual_user.get("type") == "ApiUser"
 
     def send_shotgrid_event_to_ayon(
-        self, payload: dict[str, Any], sg_projects_by_id: dict[str, Any]
+        self, payload: dict[str, Any], project_code: Optional[str]
     ):
         """Send the Shotgrid event as an Ayon event.
 
         Args:
             payload (dict): The Event data.
+            project_code (Optional[str]): The code of the event's project.
         """
         payload_id = payload["id"]
         payload_type = payload["event_type"]
@@ -365,23 +767,18 @@ class ShotgridListener:
                 f"by '{user_name}'"
             )
 
-        # fix non serializable datetime
-        payload["created_at"] = payload["created_at"].isoformat()
+        # fix non serializable datetime, on a copy so the Shotgrid event
+        # itself is left untouched
+        payload = {**payload, "created_at": payload["created_at"].isoformat()}
 
-        payload_meta = payload.get("meta", {})
-        if payload_meta.get("entity_type", "Undefined") == "Project":
-            project_name = payload.get("entity", {}).get("name", "Undefined")
-            project_id = payload.get("entity", {}).get("id", "Undefined")
-        else:
-            project_name = payload.get("project", {}).get("name", "Undefined")
-            project_id = payload.get("project", {}).get("id", "Undefined")
+        sg_project = self._get_event_project(payload)
+        project_name = sg_project.get("name", "Undefined")
 
-        sg_project = sg_projects_by_id[project_id]
         new_event_hash = get_event_hash("shotgrid.event", payload["id"])
 
         ayon_api.dispatch_event(
             "shotgrid.event",
-            sender=socket.gethostname(),
+            sender=self._hostname,
             event_hash=new_event_hash,
             project_name=project_name,
             username=user_name,
@@ -394,13 +791,14 @@ class ShotgridListener:
                 "action": "shotgrid-event",
                 "user_name": user_name,
                 "project_name": project_name,
-                "project_code": sg_project.get(self.sg_project_code_field),
+                "project_code": project_code,
                 "project_code_field": self.sg_project_code_field,
                 "sg_payload": payload,
             },
         )
 
-        self.log.info("Dispatched Ayon event with payload:", payload)
+        self.log.info(
+            "Dispatched Ayon event for Shotgrid event %s", payload_id)
 
 
 def service_main():
@@ -153,6 +153,5 @@ SG_EVENT_QUERY_FIELDS = [
     "entity",
     "user",
     "project",
-    "session_uuid",
     "created_at",
 ]
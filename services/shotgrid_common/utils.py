@@ -38,6 +38,9 @@ def get_logger(name: str) -> logging.Logger:
     log_level = os.environ.get("LOGLEVEL", "INFO").upper()
 
     logger = logging.Logger(name)
+    # set the level on the logger too, so disabled records are discarded
+    # before being created and `isEnabledFor` can be relied on
+    logger.setLevel(log_level)
     _loggers[name] = logger
     # create console handler and set level to debug
     ch = logging.StreamHandler()